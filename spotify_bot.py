@@ -1,345 +1,1055 @@
 import os
+import sys
+import json
+import time
+import asyncio
 import logging
 import random
-import spotipy
-from dotenv import load_dotenv
-from spotipy.oauth2 import SpotifyClientCredentials
-from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from telegram.helpers import escape_markdown
-
-# --- Memuat Environment Variables dari file .env ---
-# Langkah ini penting agar kunci API Anda aman dan tidak tertulis langsung di kode.
-load_dotenv()
+import re
+import string
+import importlib.util
+from functools import wraps
+from operator import itemgetter
+from pathlib import Path
+from typing import NamedTuple
+import httpx
+from cachetools import LRUCache, TTLCache
+from telegram import BotCommand, MessageEntity, Update
+from telegram.error import BadRequest
+from telegram.request import HTTPXRequest
+from telegram.ext import AIORateLimiter, Application, MessageHandler, filters, ContextTypes
 
 # --- Konfigurasi Awal ---
 # Mengaktifkan logging untuk membantu debug jika terjadi error
 logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO, force=True
 )
 # Mengatur level log untuk httpx agar tidak terlalu "berisik" di konsol
 logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
-# --- Otentikasi Spotify ---
-# Mengambil kredensial dari environment variables yang sudah dimuat oleh load_dotenv()
-SPOTIPY_CLIENT_ID = os.getenv("SPOTIPY_CLIENT_ID")
-SPOTIPY_CLIENT_SECRET = os.getenv("SPOTIPY_CLIENT_SECRET")
-
-# Mengecek apakah kredensial Spotify sudah diatur
-if not all([SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET]):
-    raise ValueError("Pastikan SPOTIPY_CLIENT_ID dan SPOTIPY_CLIENT_SECRET sudah diatur di file .env Anda.")
+# Generator acak milik bot sendiri (untuk fitur acak dan jitter backoff)
+_RNG = random.Random()
 
-# Menginisialisasi klien Spotipy dengan mode "Client Credentials"
-# Mode ini cocok untuk mengakses data publik Spotify tanpa login pengguna
+# --- Klien Spotify ---
+# orjson (opsional, pip install orjson) mengurai dan menyusun JSON 2-3x lebih cepat
+# daripada modul json bawaan; jika tidak terpasang, pakai json bawaan.
+# json_dumps selalu mengembalikan bytes, seperti orjson.dumps.
 try:
-    auth_manager = SpotifyClientCredentials(client_id=SPOTIPY_CLIENT_ID, client_secret=SPOTIPY_CLIENT_SECRET)
-    sp = spotipy.Spotify(auth_manager=auth_manager)
-    logger.info("Otentikasi dengan Spotify berhasil!")
-except Exception as e:
-    logger.error(f"Gagal otentikasi dengan Spotify: {e}")
-    exit()
+    from orjson import dumps as json_dumps, loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+
+def write_bytes_atomic(path: Path, data: bytes) -> None:
+    """Menulis file lewat file sementara lalu os.replace, agar file lama tidak terpotong jika proses mati di tengah penulisan."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+# HTTP/2 hanya dipakai jika paket h2 terpasang (pip install "httpx[http2]")
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Batas jumlah permintaan ke Spotify yang berjalan bersamaan, agar lonjakan pengguna
+# tidak langsung memicu 429 (rate limit) dari Spotify
+SPOTIFY_MAX_CONCURRENCY = 50
+
+class SpotifyRateLimitError(Exception):
+    """Spotify membatasi laju permintaan lebih lama dari yang wajar untuk ditunggu."""
+
+class SpotifyClient:
+    """Klien Spotify Web API asinkron (mode "Client Credentials") berbasis httpx.
+
+    Nama method sengaja disamakan dengan spotipy dan hasilnya berupa dict JSON
+    mentah dari Spotify, sehingga fungsi pembantu di bawah tidak perlu diubah.
+    Berbeda dengan spotipy, setiap panggilan di-await sehingga event loop tetap
+    bisa melayani pengguna lain selama menunggu respons Spotify.
+    """
+
+    TOKEN_URL = "https://accounts.spotify.com/api/token"
+    API_URL = "https://api.spotify.com/v1"
+    # Jumlah percobaan maksimal untuk satu permintaan yang terkena 429
+    MAX_RETRIES = 5
+    # Batas waktu tunggu (detik) saat terkena 429. Jika Spotify meminta menunggu lebih
+    # lama, permintaan langsung gagal agar pengguna segera mendapat balasan error.
+    MAX_RATE_LIMIT_WAIT = 60
+
+    def __init__(self, client_id: str, client_secret: str):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self._http = None
+        self._token = None
+        self._token_expires_at = 0.0
+        self._token_lock = asyncio.Lock()
+        self._refresh_task = None
+        self._semaphore = asyncio.Semaphore(SPOTIFY_MAX_CONCURRENCY)
+        self._rate_limited_until = 0.0
+
+    async def start(self) -> None:
+        """Membuka koneksi HTTP, mengambil token pertama, dan menjadwalkan pembaruan token."""
+        # Satu klien dipakai bersama untuk semua permintaan agar koneksi TCP/TLS
+        # ke Spotify tetap hidup (keep-alive) dan tidak dibuka ulang setiap kali.
+        self._http = httpx.AsyncClient(
+            timeout=10,
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=100, keepalive_expiry=75),
+        )
+        await self._refresh_token()
+        self._refresh_task = asyncio.create_task(self._refresh_token_loop())
+
+    async def close(self) -> None:
+        """Menghentikan pembaruan token dan menutup koneksi HTTP."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+        if self._http is not None:
+            await self._http.aclose()
+
+    async def _refresh_token(self) -> None:
+        """Meminta token akses baru ke Spotify."""
+        response = await self._http.post(
+            self.TOKEN_URL,
+            data={"grant_type": "client_credentials"},
+            auth=(self.client_id, self.client_secret),
+        )
+        response.raise_for_status()
+        data = json_loads(response.content)
+        self._token = data["access_token"]
+        self._token_expires_at = time.monotonic() + data["expires_in"]
+
+    async def _refresh_token_loop(self) -> None:
+        """Memperbarui token ~60 detik sebelum kedaluwarsa, di luar jalur permintaan pengguna."""
+        while True:
+            await asyncio.sleep(max(self._token_expires_at - time.monotonic() - 60, 5))
+            try:
+                await self._refresh_token()
+            except Exception:
+                # Termasuk respons token yang rusak (KeyError/ValueError), agar pembaruan tetap dicoba lagi
+                logger.exception("Gagal memperbarui token Spotify, mencoba lagi")
+
+    async def _get_token(self) -> str:
+        """Mengembalikan token akses. Token hanya diminta di sini jika pembaruan di latar belakang terlambat."""
+        if self._token and time.monotonic() < self._token_expires_at:
+            return self._token
+        async with self._token_lock:
+            if not (self._token and time.monotonic() < self._token_expires_at):
+                await self._refresh_token()
+            return self._token
+
+    async def _get(self, path: str, **params) -> dict:
+        params = {key: value for key, value in params.items() if value is not None}
+        for attempt in range(self.MAX_RETRIES):
+            # Selama Spotify membatasi laju (429), semua permintaan menunggu hingga batasnya berakhir
+            delay = self._rate_limited_until - time.monotonic()
+            if delay > self.MAX_RATE_LIMIT_WAIT:
+                raise SpotifyRateLimitError(f"Spotify membatasi laju permintaan selama {delay:.0f} detik lagi")
+            if delay > 0:
+                await asyncio.sleep(delay)
+            token = await self._get_token()
+            async with self._semaphore:
+                response = await self._http.get(
+                    f"{self.API_URL}/{path}", params=params, headers={"Authorization": f"Bearer {token}"}
+                )
+            if response.status_code != 429 or attempt == self.MAX_RETRIES - 1:
+                break
+            # Tunggu sesuai header Retry-After, minimal backoff eksponensial (maks. 30 detik), plus jitter
+            retry_after = int(response.headers.get("Retry-After", 1))
+            wait = max(retry_after, min(2 ** attempt, 30)) + _RNG.random()
+            self._rate_limited_until = max(self._rate_limited_until, time.monotonic() + wait)
+            if wait > self.MAX_RATE_LIMIT_WAIT:
+                raise SpotifyRateLimitError(f"Spotify meminta menunggu {retry_after} detik")
+            logger.warning("Spotify membatasi laju permintaan, mencoba lagi dalam %.1f detik.", wait)
+        response.raise_for_status()
+        return json_loads(response.content)
+
+    async def search(self, q: str, limit: int = 10, offset: int = 0, type: str = "track") -> dict:
+        return await self._get("search", q=q, limit=limit, offset=offset, type=type)
+
+    async def album(self, album_id: str) -> dict:
+        return await self._get(f"albums/{album_id}")
+
+    async def artist_albums(self, artist_id: str, album_type: str = None, limit: int = 20) -> dict:
+        return await self._get(f"artists/{artist_id}/albums", include_groups=album_type, limit=limit)
+
+    async def artist_top_tracks(self, artist_id: str, country: str = "US") -> dict:
+        return await self._get(f"artists/{artist_id}/top-tracks", market=country)
+
+    async def artist_related_artists(self, artist_id: str) -> dict:
+        return await self._get(f"artists/{artist_id}/related-artists")
+
+    async def new_releases(self, limit: int = 20, offset: int = 0) -> dict:
+        return await self._get("browse/new-releases", limit=limit, offset=offset)
+
+    async def albums(self, album_ids: list[str]) -> dict:
+        """Mengambil beberapa album sekaligus (maksimal 20 ID per panggilan)."""
+        return await self._get("albums", ids=",".join(album_ids))
+
+    async def artists(self, artist_ids: list[str]) -> dict:
+        """Mengambil beberapa artis sekaligus (maksimal 50 ID per panggilan)."""
+        return await self._get("artists", ids=",".join(artist_ids))
+
+# Klien dibuat oleh main() setelah kredensial dibaca, sehingga mengimpor modul ini
+# tidak membaca .env maupun menyentuh jaringan. Koneksi dan token baru disiapkan
+# di post_init() karena keduanya membutuhkan event loop yang sedang berjalan.
+sp: SpotifyClient | None = None
+
+# --- Cache Hasil Spotify ---
+# Pengguna sering mencari hal yang sama dalam waktu berdekatan. Spotify sendiri
+# menyarankan cache ~120 detik untuk hasil pencarian, sedangkan ID artis dan data
+# per artis (album, lagu terpopuler, artis terkait) jarang berubah sehingga bisa
+# disimpan lebih lama.
+SEARCH_CACHE = TTLCache(maxsize=2048, ttl=120)
+ARTIST_DATA_CACHE = TTLCache(maxsize=2048, ttl=600)
+
+def normalize_query(query: str) -> str:
+    """Menyeragamkan huruf dan spasi kueri agar "Coldplay" dan " coldplay " memakai entri cache yang sama."""
+    return " ".join(query.lower().split())
+
+# Permintaan yang sedang berjalan, per (cache, kunci). Jika banyak pengguna meminta
+# hal yang sama bersamaan, hanya satu permintaan ke Spotify yang dikirim dan
+# sisanya menunggu hasil yang sama.
+_inflight: dict[tuple, asyncio.Future] = {}
+
+async def cached_call(cache: TTLCache, key, fn, *args, skip_if=None, **kwargs):
+    """Memanggil `await fn(*args, **kwargs)` dan menyimpan hasilnya di `cache[key]`.
+
+    Hasil yang membuat `skip_if(hasil)` bernilai True (mis. hasil pencarian kosong) tidak disimpan.
+    Panggilan bersamaan dengan kunci yang sama digabung menjadi satu permintaan.
+    """
+    if key in cache:
+        return cache[key]
+    flight_key = (id(cache), key)
+    if flight_key in _inflight:
+        # shield() agar pembatalan satu penunggu tidak ikut membatalkan hasil bersama
+        return await asyncio.shield(_inflight[flight_key])
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[flight_key] = future
+    try:
+        result = await fn(*args, **kwargs)
+    except BaseException as e:
+        if not future.done():
+            # Jika pemilik permintaan dibatalkan, penunggu lain menerima error biasa
+            # (bukan CancelledError) agar handler mereka tetap mengirim balasan
+            if not isinstance(e, Exception):
+                e = RuntimeError("Permintaan ke Spotify dibatalkan")
+            future.set_exception(e)
+            # Tandai exception sudah dibaca agar asyncio tidak memberi peringatan jika tidak ada yang menunggu
+            future.exception()
+        raise
+    else:
+        if skip_if is None or not skip_if(result):
+            cache[key] = result
+        if not future.done():
+            future.set_result(result)
+        return result
+    finally:
+        del _inflight[flight_key]
+
+async def cached_search(q: str, type_: str, limit: int) -> dict:
+    """Memanggil sp.search dengan cache. Hasil kosong tidak disimpan."""
+    return await cached_call(
+        SEARCH_CACHE, (type_, normalize_query(q), limit),
+        sp.search, q=q, limit=limit, type=type_,
+        skip_if=lambda results: not results[f"{type_}s"]['items'],
+    )
+
+# ID artis di Spotify tidak pernah berubah, jadi pemetaan nama -> ID disimpan
+# tanpa batas waktu dan ikut disimpan ke disk agar tetap berlaku setelah restart.
+# Ukurannya dibatasi agar kueri salah ketik tidak menumpuk selamanya; entri yang
+# paling lama tidak dipakai dibuang lebih dulu.
+ARTIST_ID_CACHE = LRUCache(maxsize=10_000)
+ARTIST_ID_CACHE_PATH = Path(__file__).with_name("artist_id_cache.json")
+
+def load_artist_id_cache() -> None:
+    """Memuat cache ID artis dari disk, jika ada."""
+    try:
+        ARTIST_ID_CACHE.update(json_loads(ARTIST_ID_CACHE_PATH.read_bytes()))
+    except FileNotFoundError:
+        pass
+    except ValueError as e:
+        logger.warning("Cache ID artis tidak dapat dibaca, diabaikan: %s", e)
+
+def save_artist_id_cache() -> None:
+    """Menyimpan cache ID artis ke disk."""
+    try:
+        write_bytes_atomic(ARTIST_ID_CACHE_PATH, json_dumps(dict(ARTIST_ID_CACHE)))
+    except OSError as e:
+        logger.warning("Cache ID artis tidak dapat disimpan: %s", e)
+
+async def resolve_artist_id(query: str) -> str | None:
+    """Mencari ID artis berdasarkan nama. Mengembalikan None jika tidak ditemukan."""
+    key = normalize_query(query)
+    if key in ARTIST_ID_CACHE:
+        return ARTIST_ID_CACHE[key]
+    results = await cached_search(query, 'artist', 1)
+    if not results['artists']['items']:
+        return None
+    ARTIST_ID_CACHE[key] = results['artists']['items'][0]['id']
+    return ARTIST_ID_CACHE[key]
+
+# --- Pengambilan Album/Artis secara Batch ---
+class IdBatcher:
+    """Mengumpulkan permintaan per-ID yang datang dalam jeda singkat, lalu mengambil
+    semuanya lewat endpoint "Get Several" Spotify (satu panggilan per `max_batch` ID)."""
+
+    def __init__(self, fetch, result_key: str, max_batch: int, delay: float = 0.03):
+        self._fetch = fetch
+        self._result_key = result_key
+        self._max_batch = max_batch
+        self._delay = delay
+        self._pending: dict[str, list[asyncio.Future]] = {}
+        self._flush_task = None
+
+    async def get(self, item_id: str) -> dict | None:
+        """Mengembalikan objek untuk `item_id` (None jika Spotify tidak menemukannya)."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(item_id, []).append(future)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+            self._flush_task.add_done_callback(self._on_flush_done)
+        return await future
+
+    def _on_flush_done(self, task: asyncio.Task) -> None:
+        # Tugas yang dibatalkan sebelum sempat mengambil antrean: gagalkan permintaan yang menunggu
+        if self._flush_task is task:
+            pending, self._pending = self._pending, {}
+            self._flush_task = None
+            self._fail_pending(pending)
+
+    @staticmethod
+    def _fail_pending(pending: dict[str, list[asyncio.Future]]) -> None:
+        """Menggagalkan future yang belum selesai agar pemanggil get() tidak menunggu selamanya."""
+        for futures in pending.values():
+            for future in futures:
+                if not future.done():
+                    future.set_exception(RuntimeError("Pengambilan batch dibatalkan"))
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self._delay)
+        pending, self._pending = self._pending, {}
+        self._flush_task = None
+        ids = list(pending)
+        try:
+            await asyncio.gather(*(
+                self._fetch_chunk(ids[start:start + self._max_batch], pending)
+                for start in range(0, len(ids), self._max_batch)
+            ))
+        finally:
+            self._fail_pending(pending)
+
+    async def _fetch_chunk(self, chunk: list[str], pending: dict[str, list[asyncio.Future]]) -> None:
+        try:
+            items = (await self._fetch(chunk))[self._result_key]
+        except Exception as e:
+            for item_id in chunk:
+                for future in pending[item_id]:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for item_id, item in zip(chunk, items):
+            for future in pending[item_id]:
+                if not future.done():
+                    future.set_result(item)
+        # Jika Spotify mengembalikan lebih sedikit item dari ID yang diminta, sisanya dianggap tidak ditemukan
+        for item_id in chunk[len(items):]:
+            for future in pending[item_id]:
+                if not future.done():
+                    future.set_result(None)
+
+# `sp` baru dibuat di main(), jadi diakses lewat lambda saat batch dikirim
+album_batcher = IdBatcher(lambda ids: sp.albums(ids), 'albums', max_batch=20)
+artist_batcher = IdBatcher(lambda ids: sp.artists(ids), 'artists', max_batch=50)
+
+# --- Kumpulan ID untuk Fitur Acak ---
+# /randomalbum dan /randomartist mengambil ID dari kumpulan yang disiapkan saat bot
+# mulai, lalu mengambil detailnya dengan satu panggilan batch. ID yang sudah
+# ditampilkan dikeluarkan dari kumpulan; jika sisanya menipis, kumpulan diisi ulang
+# di latar belakang dengan satu pencarian berisi 50 hasil.
+POOL_TARGET_SIZE = 500
+POOL_REFILL_THRESHOLD = 25
+
+# Kueri pencarian acak untuk mengisi ulang kumpulan; {letter} diganti huruf acak
+POOL_REFILL_QUERIES = {
+    'album': 'year:2000-2025 track:{letter}',
+    'artist': '{letter}%',
+}
+
+_ALPHABET = string.ascii_lowercase
+
+_refill_tasks: dict[str, asyncio.Task] = {}
+
+async def build_discovery_pools(application: Application) -> None:
+    """Mengisi bot_data['album_pool'] dan bot_data['artist_pool'] dari daftar rilis terbaru."""
+    album_ids, artist_ids = [], {}
+    offset = 0
+    while len(album_ids) < POOL_TARGET_SIZE:
+        page = (await sp.new_releases(limit=50, offset=offset))['albums']
+        for album in page['items']:
+            album_ids.append(album['id'])
+            for artist in album['artists']:
+                artist_ids[artist['id']] = None
+        if not page['next']:
+            break
+        offset += 50
+    artist_ids = list(artist_ids)
+    _RNG.shuffle(album_ids)
+    _RNG.shuffle(artist_ids)
+    application.bot_data['album_pool'] = album_ids
+    application.bot_data['artist_pool'] = artist_ids
+    logger.info("Kumpulan acak siap: %s album, %s artis.", len(album_ids), len(artist_ids))
+
+async def refill_pool(bot_data: dict, kind: str) -> None:
+    """Menambahkan hingga 50 ID acak ke bot_data[f'{kind}_pool'] lewat satu pencarian."""
+    query = POOL_REFILL_QUERIES[kind].format(letter=_RNG.choice(_ALPHABET))
+    try:
+        results = await sp.search(q=query, type=kind, limit=50, offset=_RNG.randrange(451))
+    except Exception as e:
+        logger.error("Gagal mengisi ulang kumpulan %s acak: %s", kind, e)
+        return
+    ids = [item['id'] for item in results[f"{kind}s"]['items']]
+    _RNG.shuffle(ids)
+    bot_data.setdefault(f"{kind}_pool", []).extend(ids)
+
+def schedule_pool_refill(bot_data: dict, kind: str) -> asyncio.Task:
+    """Menjadwalkan refill_pool(); tidak membuat tugas baru jika pengisian sebelumnya masih berjalan."""
+    task = _refill_tasks.get(kind)
+    if task is None or task.done():
+        task = _refill_tasks[kind] = asyncio.create_task(refill_pool(bot_data, kind))
+    return task
+
+async def take_from_pool(bot_data: dict, kind: str, count: int = 5) -> list[str]:
+    """Mengeluarkan hingga `count` ID dari kumpulan `kind` ('album' atau 'artist')."""
+    pool = bot_data.setdefault(f"{kind}_pool", [])
+    refilled = len(pool) < count
+    if refilled:
+        await schedule_pool_refill(bot_data, kind)
+    ids = [pool.pop() for _ in range(min(count, len(pool)))]
+    # Tidak dijadwalkan lagi jika baru saja menunggu pengisian, agar saat Spotify
+    # bermasalah satu perintah tidak memicu dua pencarian yang sama-sama gagal
+    if not refilled and len(pool) < POOL_REFILL_THRESHOLD:
+        schedule_pool_refill(bot_data, kind)
+    return ids
 
 # --- Fungsi-fungsi untuk Command Handler Telegram ---
 
+# Teks balasan statis disusun sekali saat modul dimuat, bukan di setiap pemanggilan handler
+START_SUFFIX = (
+    "!\n\n"
+    "Saya adalah bot musik multifungsi. Gunakan perintah /cari, /album, atau /artist untuk menjelajahi fitur-fitur yang ada."
+)
+HELP_TEXT = (
+    "Berikut cara menggunakan saya:\n\n"
+    "*FITUR PENCARIAN:*\n"
+    "🔎 /cari - Menampilkan menu pencarian.\n"
+    "🎵 /caritrack [nama lagu] - Mencari lagu beserta detail albumnya.\n"
+    "🎤 /cariartist [nama artis] - Mencari artis dan statistiknya.\n"
+    "💿 /carialbum [nama album] - Mencari album dan detailnya.\n\n"
+    "*FITUR ALBUM:*\n"
+    "💿 /album - Menampilkan menu fitur album.\n"
+    "🎲 /randomalbum - Menampilkan 5 album acak.\n"
+    "✨ /getnewreleases - Menampilkan 5 rilis album terbaru.\n\n"
+    "*FITUR ARTIS:*\n"
+    "👤 /artist - Menampilkan menu fitur artis.\n"
+    "🎲 /randomartist - Menampilkan 5 artis acak.\n"
+    "💿 /getartistalbums [nama artis] - Menampilkan album dari artis.\n"
+    "➕ /more - Menampilkan album berikutnya dari /getartistalbums.\n"
+    "🏆 /gettoptracks [nama artis] - Menampilkan lagu terpopuler dari artis.\n"
+    "🤝 /getrelated [nama artis] - Menampilkan artis serupa."
+)
+SEARCH_MENU_TEXT = (
+    "Selamat datang di Menu Pencarian!\n\n"
+    "Gunakan perintah berikut untuk mencari berdasarkan kategori:\n\n"
+    "🎵 /caritrack [nama lagu]\n"
+    "🎤 /cariartist [nama artis]\n"
+    "💿 /carialbum [nama album]"
+)
+ALBUM_MENU_TEXT = "Selamat datang di Menu Album Discovery!\n\n🎲 /randomalbum\n✨ /getnewreleases"
+ARTIST_MENU_TEXT = "Selamat datang di Menu Artis Discovery!\n\n🎲 /randomartist\n💿 /getartistalbums [nama artis]\n🏆 /gettoptracks [nama artis]\n🤝 /getrelated [nama artis]"
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Mengirim pesan sambutan saat pengguna memulai bot dengan /start."""
     user = update.effective_user
-    await update.message.reply_html(
-        f"👋 Halo, {user.mention_html()}!\n\n"
-        "Saya adalah bot musik multifungsi. Gunakan perintah /cari, /album, atau /artist untuk menjelajahi fitur-fitur yang ada.",
-    )
+    await update.message.reply_html(f"👋 Halo, {user.mention_html()}" + START_SUFFIX)
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Mengirim pesan bantuan saat pengguna mengirim /help."""
-    await update.message.reply_text(
-        "Berikut cara menggunakan saya:\n\n"
-        "*FITUR PENCARIAN:*\n"
-        "🔎 /cari - Menampilkan menu pencarian.\n"
-        "🎵 /caritrack [nama lagu] - Mencari lagu beserta detail albumnya.\n"
-        "🎤 /cariartist [nama artis] - Mencari artis dan statistiknya.\n"
-        "💿 /carialbum [nama album] - Mencari album dan detailnya.\n\n"
-        "*FITUR ALBUM:*\n"
-        "💿 /album - Menampilkan menu fitur album.\n"
-        "🎲 /randomalbum - Menampilkan 5 album acak.\n"
-        "✨ /getnewreleases - Menampilkan 5 rilis album terbaru.\n\n"
-        "*FITUR ARTIS:*\n"
-        "👤 /artist - Menampilkan menu fitur artis.\n"
-        "🎲 /randomartist - Menampilkan 5 artis acak.\n"
-        "💿 /getartistalbums [nama artis] - Menampilkan album dari artis.\n"
-        "🏆 /gettoptracks [nama artis] - Menampilkan lagu terpopuler dari artis.\n"
-        "� /getrelated [nama artis] - Menampilkan artis serupa."
-    )
+    await update.message.reply_text(HELP_TEXT)
 
 # --- Fungsi Pembantu (Helpers) ---
 
-async def send_album_info(update: Update, context: ContextTypes.DEFAULT_TYPE, album: dict):
-    """Fungsi pembantu untuk mengirim informasi album yang ringkas."""
-    album_name = escape_markdown(album['name'], version=2)
-    artists = escape_markdown(", ".join([artist['name'] for artist in album['artists']]), version=2)
-    spotify_url = album['external_urls']['spotify']
-    album_cover_url = album['images'][0]['url'] if album['images'] else None
-    release_date = escape_markdown(album['release_date'], version=2)
-
-    caption = (
-        f"💿 *Album:* {album_name}\n"
-        f"👤 *Artis:* {artists}\n"
-        f"🗓️ *Rilis:* {release_date}\n\n"
-        f"[Buka di Spotify]({spotify_url})"
+# Escape MarkdownV2 dengan regex yang dikompilasi sekali. Hasilnya sama dengan
+# escape_markdown(text, version=2) tanpa percabangan versi di setiap pemanggilan.
+_MDV2_PAT = re.compile(r'([_*\[\]()~`>#+\-=|{}.!\\])')
+
+def _esc(text: str) -> str:
+    """Meng-escape karakter khusus MarkdownV2 pada `text`."""
+    return _MDV2_PAT.sub(r'\\\1', text)
+
+# Kueri tanpa satu kata pun sepanjang ini (mis. satu huruf, satu emoji, atau "a b") ditolak
+# sebelum dikirim ke Spotify, agar tidak membuang kuota untuk hasil yang tidak berguna
+MIN_QUERY_LENGTH = 2
+
+def has_query(context: ContextTypes.DEFAULT_TYPE) -> bool:
+    """Mengecek apakah argumen perintah memuat setidaknya satu kata sepanjang MIN_QUERY_LENGTH karakter."""
+    return any(len(arg) >= MIN_QUERY_LENGTH for arg in context.args or ())
+
+# Mengambil field 'name' dari daftar artis tanpa membuat list sementara
+_get_name = itemgetter('name')
+
+# --- Tampilan Ringkas Data Spotify ---
+# Objek album/artis dari Spotify memuat puluhan field, padahal yang ditampilkan
+# hanya beberapa. Field tersebut diambil sekali ke NamedTuple agar dict mentah
+# yang besar bisa segera dibebaskan.
+class AlbumView(NamedTuple):
+    name: str
+    artists: str
+    url: str
+    cover: str | None
+    release_date: str
+    total_tracks: int
+    album_type: str
+
+class ArtistView(NamedTuple):
+    name: str
+    url: str
+    image: str | None
+    genres: str
+    popularity: int
+    followers: int
+
+class TrackView(NamedTuple):
+    name: str
+    artists: str
+    url: str
+    album: AlbumView
+
+def view_album(album: dict) -> AlbumView:
+    """Mengambil field album yang ditampilkan bot."""
+    return AlbumView(
+        album['name'],
+        ", ".join(map(_get_name, album['artists'])),
+        album['external_urls']['spotify'],
+        album['images'][0]['url'] if album['images'] else None,
+        album['release_date'],
+        album.get('total_tracks', 0),
+        album.get('album_type', 'album'),
     )
 
-    if album_cover_url:
-        await context.bot.send_photo(chat_id=update.effective_chat.id, photo=album_cover_url, caption=caption, parse_mode='MarkdownV2')
-    else:
-        await update.message.reply_text(caption, parse_mode='MarkdownV2')
+def view_artist(artist: dict) -> ArtistView:
+    """Mengambil field artis yang ditampilkan bot."""
+    return ArtistView(
+        artist['name'],
+        artist['external_urls']['spotify'],
+        artist['images'][0]['url'] if artist['images'] else None,
+        ", ".join(artist['genres']),
+        artist['popularity'],
+        artist['followers']['total'],
+    )
 
-async def send_artist_info_detailed(update: Update, context: ContextTypes.DEFAULT_TYPE, artist: dict):
-    """Fungsi pembantu untuk mengirim informasi artis yang detail."""
-    artist_name = escape_markdown(artist['name'], version=2)
-    spotify_url = artist['external_urls']['spotify']
-    artist_image_url = artist['images'][0]['url'] if artist['images'] else None
-    genres = escape_markdown(", ".join(artist['genres']) or "Tidak ada genre", version=2)
-    popularity = artist['popularity']
-    followers = artist['followers']['total']
-
-    caption = (
-        f"🎤 *Artis:* {artist_name}\n"
-        f"🔥 *Popularitas:* {popularity}/100\n"
-        f"👥 *Pengikut:* {followers:,}\n"
-        f"🏷️ *Genre:* {genres}\n\n"
-        f"[Buka di Spotify]({spotify_url})"
+def view_track(track: dict) -> TrackView:
+    """Mengambil field lagu (beserta albumnya) yang ditampilkan bot."""
+    return TrackView(
+        track['name'],
+        ", ".join(map(_get_name, track['artists'])),
+        track['external_urls']['spotify'],
+        view_album(track['album']),
     )
 
-    if artist_image_url:
-        await context.bot.send_photo(chat_id=update.effective_chat.id, photo=artist_image_url, caption=caption, parse_mode='MarkdownV2')
-    else:
-        await update.message.reply_text(caption, parse_mode='MarkdownV2')
+# --- Penyusun Caption ---
+# Caption dikirim sebagai teks biasa ditambah MessageEntity (tebal/tautan), sehingga
+# nama lagu, album, dan artis tidak perlu di-escape untuk MarkdownV2 sama sekali.
+class CaptionBuilder:
+    """Menyusun teks caption beserta entity-nya; offset dihitung dalam unit UTF-16 sesuai aturan Telegram."""
 
-async def send_album_info_detailed(update: Update, context: ContextTypes.DEFAULT_TYPE, album: dict):
-    """Fungsi pembantu untuk mengirim informasi album yang detail."""
-    album_name = escape_markdown(album['name'], version=2)
-    artists = escape_markdown(", ".join([artist['name'] for artist in album['artists']]), version=2)
-    spotify_url = album['external_urls']['spotify']
-    album_cover_url = album['images'][0]['url'] if album['images'] else None
-    release_date = escape_markdown(album['release_date'], version=2)
-    total_tracks = album['total_tracks']
-    album_type = escape_markdown(album['album_type'], version=2)
-
-    caption = (
-        f"💿 *Album:* {album_name}\n"
-        f"👤 *Artis:* {artists}\n"
-        f"🏷️ *Tipe:* {album_type}\n"
-        f"🎶 *Total Lagu:* {total_tracks}\n"
-        f"🗓️ *Tanggal Rilis:* {release_date}\n\n"
-        f"[Buka di Spotify]({spotify_url})"
+    def __init__(self):
+        self._parts = []
+        self._length = 0
+        self.entities = []
+
+    def text(self, text: str) -> "CaptionBuilder":
+        self._parts.append(text)
+        self._length += len(text.encode('utf-16-le')) // 2
+        return self
+
+    def _entity(self, text: str, type_: str, **kwargs) -> "CaptionBuilder":
+        offset = self._length
+        self.text(text)
+        self.entities.append(MessageEntity(type=type_, offset=offset, length=self._length - offset, **kwargs))
+        return self
+
+    def bold(self, text: str) -> "CaptionBuilder":
+        return self._entity(text, MessageEntity.BOLD)
+
+    def link(self, text: str, url: str) -> "CaptionBuilder":
+        return self._entity(text, MessageEntity.TEXT_LINK, url=url)
+
+    def __str__(self) -> str:
+        return "".join(self._parts)
+
+def album_caption(album: AlbumView) -> CaptionBuilder:
+    return (
+        CaptionBuilder()
+        .text("💿 ").bold("Album:").text(f" {album.name}\n")
+        .text("👤 ").bold("Artis:").text(f" {album.artists}\n")
+        .text("🗓️ ").bold("Rilis:").text(f" {album.release_date}\n\n")
+        .link("Buka di Spotify", album.url)
     )
 
-    if album_cover_url:
-        await context.bot.send_photo(chat_id=update.effective_chat.id, photo=album_cover_url, caption=caption, parse_mode='MarkdownV2')
-    else:
-        await update.message.reply_text(caption, parse_mode='MarkdownV2')
+def artist_caption_detailed(artist: ArtistView) -> CaptionBuilder:
+    return (
+        CaptionBuilder()
+        .text("🎤 ").bold("Artis:").text(f" {artist.name}\n")
+        .text("🔥 ").bold("Popularitas:").text(f" {artist.popularity}/100\n")
+        .text("👥 ").bold("Pengikut:").text(f" {artist.followers:,}\n")
+        .text("🏷️ ").bold("Genre:").text(f" {artist.genres or 'Tidak ada genre'}\n\n")
+        .link("Buka di Spotify", artist.url)
+    )
+
+def album_caption_detailed(album: AlbumView) -> CaptionBuilder:
+    return (
+        CaptionBuilder()
+        .text("💿 ").bold("Album:").text(f" {album.name}\n")
+        .text("👤 ").bold("Artis:").text(f" {album.artists}\n")
+        .text("🏷️ ").bold("Tipe:").text(f" {album.album_type}\n")
+        .text("🎶 ").bold("Total Lagu:").text(f" {album.total_tracks}\n")
+        .text("🗓️ ").bold("Tanggal Rilis:").text(f" {album.release_date}\n\n")
+        .link("Buka di Spotify", album.url)
+    )
+
+def track_caption(track: TrackView) -> CaptionBuilder:
+    return (
+        CaptionBuilder()
+        .text("🎵 ").bold("Lagu Ditemukan:").text(" ").link(track.name, track.url).text("\n")
+        .text("👤 ").bold("Oleh:").text(f" {track.artists}\n\n")
+        .bold("--- Detail Album ---").text("\n")
+        .text("💿 ").bold("Album:").text(" ").link(track.album.name, track.album.url).text("\n")
+        .text("🔢 ").bold("Total Lagu:").text(f" {track.album.total_tracks}\n")
+        .text("🗓️ ").bold("Rilis:").text(f" {track.album.release_date}")
+    )
+
+# Caption yang sudah disusun, per (fungsi penyusun, URL Spotify). Album dan artis
+# populer sering ditampilkan ulang, sehingga caption-nya cukup disusun sekali.
+CAPTION_CACHE = TTLCache(maxsize=4096, ttl=600)
+
+def cached_caption(build, view) -> CaptionBuilder:
+    """Mengembalikan caption `build(view)` dari cache, menyusunnya jika belum ada."""
+    key = (build, view.url)
+    caption = CAPTION_CACHE.get(key)
+    if caption is None:
+        caption = CAPTION_CACHE[key] = build(view)
+    return caption
+
+# Menyimpan file_id Telegram untuk setiap URL gambar yang pernah dikirim. Dengan
+# file_id, Telegram tidak perlu mengunduh ulang sampul yang sama dari CDN Spotify.
+PHOTO_FILE_ID_CACHE = TTLCache(maxsize=10_000, ttl=86400)
+# Cache file_id disimpan ke disk saat bot berhenti dan dimuat lagi saat bot mulai,
+# sehingga sampul yang sudah pernah dikirim tetap tidak diunduh ulang setelah restart.
+PHOTO_FILE_ID_CACHE_PATH = Path(__file__).with_name("file_id_cache.json")
+
+def load_photo_file_id_cache() -> None:
+    """Memuat cache file_id dari disk, jika ada."""
+    try:
+        PHOTO_FILE_ID_CACHE.update(json_loads(PHOTO_FILE_ID_CACHE_PATH.read_bytes()))
+    except FileNotFoundError:
+        pass
+    except ValueError as e:
+        logger.warning("Cache file_id tidak dapat dibaca, diabaikan: %s", e)
+
+def save_photo_file_id_cache() -> None:
+    """Menyimpan cache file_id ke disk."""
+    try:
+        write_bytes_atomic(PHOTO_FILE_ID_CACHE_PATH, json_dumps(dict(PHOTO_FILE_ID_CACHE)))
+    except OSError as e:
+        logger.warning("Cache file_id tidak dapat disimpan: %s", e)
+
+async def send_photo_cached(context: ContextTypes.DEFAULT_TYPE, chat_id: int, photo_url: str, **kwargs):
+    """Mengirim foto dari URL, memakai ulang file_id Telegram jika URL tersebut sudah pernah dikirim."""
+    file_id = PHOTO_FILE_ID_CACHE.get(photo_url)
+    if file_id is not None:
+        try:
+            return await context.bot.send_photo(chat_id=chat_id, photo=file_id, **kwargs)
+        except BadRequest as e:
+            # file_id hanya berlaku untuk bot yang menerimanya (mis. token diganti); kirim ulang dari URL
+            logger.warning("file_id untuk %s ditolak Telegram, dikirim ulang dari URL: %s", photo_url, e)
+            PHOTO_FILE_ID_CACHE.pop(photo_url, None)
+    message = await context.bot.send_photo(chat_id=chat_id, photo=photo_url, **kwargs)
+    if message.photo:
+        PHOTO_FILE_ID_CACHE[photo_url] = message.photo[-1].file_id
+    return message
+
+# Batas jumlah kartu info yang dikirim bersamaan dari seluruh chat, sedikit di bawah
+# batas Telegram 30 pesan/detik per bot
+GLOBAL_SEND_LIMIT = 25
+_global_send_semaphore = asyncio.Semaphore(GLOBAL_SEND_LIMIT)
+
+async def send_caption(update: Update, context: ContextTypes.DEFAULT_TYPE, caption: CaptionBuilder, photo_url: str | None):
+    """Mengirim caption beserta entity-nya, sebagai foto jika ada gambar atau sebagai teks biasa jika tidak."""
+    async with _global_send_semaphore:
+        if photo_url:
+            await send_photo_cached(context, update.effective_chat.id, photo_url, caption=str(caption), caption_entities=caption.entities)
+        else:
+            await update.message.reply_text(str(caption), entities=caption.entities)
+
+async def send_album_info(update: Update, context: ContextTypes.DEFAULT_TYPE, album: AlbumView):
+    """Fungsi pembantu untuk mengirim informasi album yang ringkas."""
+    await send_caption(update, context, cached_caption(album_caption, album), album.cover)
+
+async def send_artist_info_detailed(update: Update, context: ContextTypes.DEFAULT_TYPE, artist: ArtistView):
+    """Fungsi pembantu untuk mengirim informasi artis yang detail."""
+    await send_caption(update, context, cached_caption(artist_caption_detailed, artist), artist.image)
+
+async def send_album_info_detailed(update: Update, context: ContextTypes.DEFAULT_TYPE, album: AlbumView):
+    """Fungsi pembantu untuk mengirim informasi album yang detail."""
+    await send_caption(update, context, cached_caption(album_caption_detailed, album), album.cover)
+
+async def send_track_info(update: Update, context: ContextTypes.DEFAULT_TYPE, track: TrackView):
+    """Fungsi pembantu untuk mengirim informasi lagu beserta detail albumnya."""
+    await send_caption(update, context, cached_caption(track_caption, track), track.album.cover)
+
+# Batas pengiriman bersamaan per chat agar tidak melanggar batas pesan Telegram
+CHAT_SEND_LIMIT = 5
+# Semaphore per chat dibuang setelah 10 menit tidak dipakai agar tidak menumpuk untuk setiap chat
+_chat_semaphores = TTLCache(maxsize=10_000, ttl=600)
+
+async def send_all(update: Update, context: ContextTypes.DEFAULT_TYPE, send_fn, items) -> None:
+    """Mengirim beberapa item secara bersamaan dengan `send_fn`, maksimal CHAT_SEND_LIMIT sekaligus per chat."""
+    chat_id = update.effective_chat.id
+    semaphore = _chat_semaphores.get(chat_id) or asyncio.Semaphore(CHAT_SEND_LIMIT)
+    # Disimpan ulang setiap dipakai agar masa berlakunya diperpanjang selama chat masih aktif
+    _chat_semaphores[chat_id] = semaphore
+
+    async def send_one(item):
+        async with semaphore:
+            await send_fn(update, context, item)
+
+    await asyncio.gather(*(send_one(item) for item in items))
 
 # --- Fitur Pencarian Baru ---
 async def search_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Menampilkan menu untuk fitur-fitur pencarian."""
-    await update.message.reply_text(
-        "Selamat datang di Menu Pencarian!\n\n"
-        "Gunakan perintah berikut untuk mencari berdasarkan kategori:\n\n"
-        "🎵 /caritrack [nama lagu]\n"
-        "🎤 /cariartist [nama artis]\n"
-        "💿 /carialbum [nama album]",
-        parse_mode='Markdown'
-    )
+    await update.message.reply_text(SEARCH_MENU_TEXT, parse_mode='Markdown')
 
 async def search_tracks(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Mencari lagu dan menampilkan detailnya beserta info album."""
-    if not context.args:
+    if not has_query(context):
         await update.message.reply_text("Tolong berikan nama lagu. Contoh: /caritrack Bohemian Rhapsody")
         return
     query = " ".join(context.args)
     await update.message.reply_text(f"🔍 Mencari lagu '{query}'...")
 
     try:
-        results = sp.search(q=query, limit=3, type='track') # Batasi 3 agar tidak spam
+        results = await cached_search(query, 'track', 3) # Batasi 3 agar tidak spam
         tracks = results['tracks']['items']
         if not tracks:
-            await update.message.reply_text(f"Maaf, lagu '{escape_markdown(query, version=2)}' tidak ditemukan\\.", parse_mode='MarkdownV2')
+            await update.message.reply_text(f"Maaf, lagu '{_esc(query)}' tidak ditemukan\\.", parse_mode='MarkdownV2')
             return
 
-        for track in tracks:
-            track_name = escape_markdown(track['name'], version=2)
-            track_url = track['external_urls']['spotify']
-            track_artists = escape_markdown(", ".join([a['name'] for a in track['artists']]), version=2)
-            
-            # Info Album
-            album_obj = track['album']
-            album_name = escape_markdown(album_obj['name'], version=2)
-            album_url = album_obj['external_urls']['spotify']
-            album_release = escape_markdown(album_obj['release_date'], version=2)
-            album_total_tracks = album_obj['total_tracks']
-            album_cover_url = album_obj['images'][0]['url'] if album_obj['images'] else None
-
-            caption = (
-                f"🎵 *Lagu Ditemukan:* [{track_name}]({track_url})\n"
-                f"👤 *Oleh:* {track_artists}\n\n"
-                f"*\\-\\-\\- Detail Album \\-\\-\\-*\n"
-                f"💿 *Album:* [{album_name}]({album_url})\n"
-                f"🔢 *Total Lagu:* {album_total_tracks}\n"
-                f"🗓️ *Rilis:* {album_release}"
-            )
-
-            if album_cover_url:
-                await context.bot.send_photo(chat_id=update.effective_chat.id, photo=album_cover_url, caption=caption, parse_mode='MarkdownV2')
-            else:
-                await update.message.reply_text(caption, parse_mode='MarkdownV2')
+        await send_all(update, context, send_track_info, [view_track(track) for track in tracks])
 
     except Exception as e:
-        logger.error(f"Error saat mencari lagu: {e}")
+        logger.error("Error saat mencari lagu: %s", e)
         await update.message.reply_text("Maaf, terjadi kesalahan saat mencari lagu.")
 
 async def search_artists(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Mencari artis dan menampilkan detailnya."""
-    if not context.args:
+    if not has_query(context):
         await update.message.reply_text("Tolong berikan nama artis. Contoh: /cariartist Queen")
         return
     query = " ".join(context.args)
     await update.message.reply_text(f"🔍 Mencari artis '{query}'...")
 
     try:
-        results = sp.search(q=query, limit=1, type='artist')
+        results = await cached_search(query, 'artist', 1)
         artists = results['artists']['items']
         if not artists:
-            await update.message.reply_text(f"Maaf, artis '{escape_markdown(query, version=2)}' tidak ditemukan\\.", parse_mode='MarkdownV2')
+            await update.message.reply_text(f"Maaf, artis '{_esc(query)}' tidak ditemukan\\.", parse_mode='MarkdownV2')
             return
         
-        await send_artist_info_detailed(update, context, artists[0])
+        await send_artist_info_detailed(update, context, view_artist(artists[0]))
 
     except Exception as e:
-        logger.error(f"Error saat mencari artis: {e}")
+        logger.error("Error saat mencari artis: %s", e)
         await update.message.reply_text("Maaf, terjadi kesalahan saat mencari artis.")
 
 async def search_albums(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Mencari album dan menampilkan detailnya."""
-    if not context.args:
+    if not has_query(context):
         await update.message.reply_text("Tolong berikan nama album. Contoh: /carialbum A Night at the Opera")
         return
     query = " ".join(context.args)
     await update.message.reply_text(f"🔍 Mencari album '{query}'...")
 
     try:
-        results = sp.search(q=query, limit=1, type='album')
+        results = await cached_search(query, 'album', 1)
         albums = results['albums']['items']
         if not albums:
-            await update.message.reply_text(f"Maaf, album '{escape_markdown(query, version=2)}' tidak ditemukan\\.", parse_mode='MarkdownV2')
+            await update.message.reply_text(f"Maaf, album '{_esc(query)}' tidak ditemukan\\.", parse_mode='MarkdownV2')
             return
         
-        # Ambil detail lengkap untuk mendapatkan 'album_type'
-        album_full_details = sp.album(albums[0]['id'])
-        await send_album_info_detailed(update, context, album_full_details)
+        # Objek album hasil pencarian sudah memuat 'album_type' dan 'total_tracks',
+        # jadi tidak perlu memanggil sp.album() lagi
+        await send_album_info_detailed(update, context, view_album(albums[0]))
 
     except Exception as e:
-        logger.error(f"Error saat mencari album: {e}")
+        logger.error("Error saat mencari album: %s", e)
         await update.message.reply_text("Maaf, terjadi kesalahan saat mencari album.")
 
 # --- Fitur Album (Discovery) ---
 async def album_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    await update.message.reply_text("Selamat datang di Menu Album Discovery!\n\n🎲 /randomalbum\n✨ /getnewreleases", parse_mode='Markdown')
+    await update.message.reply_text(ALBUM_MENU_TEXT, parse_mode='Markdown')
 async def get_random_albums(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_text("🎲 Mengambil 5 album acak...");
     try:
-        results = sp.search(q=f'year:2000-2025 track:{random.choice("abcdefghijklmnopqrstuvwxyz")}', type='album', limit=5, offset=random.randint(0, 500))
-        if not results['albums']['items']: await update.message.reply_text("Gagal mendapatkan album acak, coba lagi!"); return
-        for album in results['albums']['items']: await send_album_info(update, context, album)
-    except Exception as e: logger.error(f"Error saat mengambil album acak: {e}"); await update.message.reply_text("Maaf, terjadi kesalahan.")
+        album_ids = await take_from_pool(context.bot_data, 'album')
+        if not album_ids: await update.message.reply_text("Gagal mendapatkan album acak, coba lagi!"); return
+        albums = await asyncio.gather(*(album_batcher.get(album_id) for album_id in album_ids))
+        await send_all(update, context, send_album_info, [view_album(album) for album in albums if album])
+    except Exception as e: logger.error("Error saat mengambil album acak: %s", e); await update.message.reply_text("Maaf, terjadi kesalahan.")
 async def get_new_releases(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_text("✨ Menampilkan 5 rilis album terbaru...");
     try:
-        results = sp.new_releases(limit=5)
-        for album in results['albums']['items']: await send_album_info(update, context, album)
-    except Exception as e: logger.error(f"Error saat mengambil rilis terbaru: {e}"); await update.message.reply_text("Maaf, terjadi kesalahan.")
+        results = await sp.new_releases(limit=5)
+        await send_all(update, context, send_album_info, [view_album(album) for album in results['albums']['items']])
+    except Exception as e: logger.error("Error saat mengambil rilis terbaru: %s", e); await update.message.reply_text("Maaf, terjadi kesalahan.")
 
 # --- Fitur Artis (Discovery) ---
+# Jumlah album yang ditampilkan per halaman oleh /getartistalbums dan /more
+ALBUM_PAGE_SIZE = 5
+
+async def send_album_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Mengirim ALBUM_PAGE_SIZE album berikutnya dari context.user_data['more_albums']."""
+    remaining = context.user_data['more_albums']
+    page, context.user_data['more_albums'] = remaining[:ALBUM_PAGE_SIZE], remaining[ALBUM_PAGE_SIZE:]
+    await send_all(update, context, send_album_info, page)
+    if context.user_data['more_albums']:
+        await update.message.reply_text(f"Masih ada {len(context.user_data['more_albums'])} album lagi. Kirim /more untuk melihat berikutnya.")
+
 async def artist_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    await update.message.reply_text("Selamat datang di Menu Artis Discovery!\n\n🎲 /randomartist\n💿 /getartistalbums [nama artis]\n🏆 /gettoptracks [nama artis]\n🤝 /getrelated [nama artis]", parse_mode='Markdown')
+    await update.message.reply_text(ARTIST_MENU_TEXT, parse_mode='Markdown')
 async def get_random_artists(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_text("🎲 Mengambil 5 artis acak...");
     try:
-        random_char = random.choice("abcdefghijklmnopqrstuvwxyz"); query = f'{random_char}%'; random_offset = random.randint(0, 900)
-        results = sp.search(q=query, type='artist', limit=5, offset=random_offset)
-        if not results['artists']['items']: await update.message.reply_text("Gagal mendapatkan artis acak, coba lagi!"); return
-        for artist in results['artists']['items']: await send_artist_info_detailed(update, context, artist)
-    except Exception as e: logger.error(f"Error saat mengambil artis acak: {e}"); await update.message.reply_text("Maaf, terjadi kesalahan.")
+        artist_ids = await take_from_pool(context.bot_data, 'artist')
+        if not artist_ids: await update.message.reply_text("Gagal mendapatkan artis acak, coba lagi!"); return
+        artists = await asyncio.gather(*(artist_batcher.get(artist_id) for artist_id in artist_ids))
+        await send_all(update, context, send_artist_info_detailed, [view_artist(artist) for artist in artists if artist])
+    except Exception as e: logger.error("Error saat mengambil artis acak: %s", e); await update.message.reply_text("Maaf, terjadi kesalahan.")
 async def get_artist_albums(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not context.args: await update.message.reply_text("Contoh: /getartistalbums Coldplay"); return
-    query = " ".join(context.args); await update.message.reply_text(f"💿 Mencari album dari '{query}'...")
+    if not has_query(context): await update.message.reply_text("Contoh: /getartistalbums Coldplay"); return
+    query = " ".join(context.args)
     try:
-        results = sp.search(q=query, limit=1, type='artist')
-        if not results['artists']['items']: await update.message.reply_text(f"Maaf, artis *'{escape_markdown(query, version=2)}'* tidak ditemukan\\.", parse_mode='MarkdownV2'); return
-        artist_id = results['artists']['items'][0]['id']; albums = sp.artist_albums(artist_id, album_type='album', limit=10)
-        if not albums['items']: await update.message.reply_text(f"Artis *'{escape_markdown(query, version=2)}'* tidak memiliki album\\.", parse_mode='MarkdownV2'); return
-        for album in albums['items']: await send_album_info(update, context, album)
-    except Exception as e: logger.error(f"Error saat mengambil album artis: {e}"); await update.message.reply_text("Maaf, terjadi kesalahan.")
+        # Pesan status dikirim bersamaan dengan pencarian ID artis agar keduanya tidak saling menunggu
+        _, artist_id = await asyncio.gather(update.message.reply_text(f"💿 Mencari album dari '{query}'..."), resolve_artist_id(query))
+        if artist_id is None: await update.message.reply_text(f"Maaf, artis *'{_esc(query)}'* tidak ditemukan\\.", parse_mode='MarkdownV2'); return
+        # Ambil 50 album sekaligus (biaya kuota sama dengan 10), tampilkan 5 pertama, dan simpan sisanya untuk /more
+        albums = await cached_call(ARTIST_DATA_CACHE, ('albums', artist_id), sp.artist_albums, artist_id, album_type='album', limit=50)
+        if not albums['items']: await update.message.reply_text(f"Artis *'{_esc(query)}'* tidak memiliki album\\.", parse_mode='MarkdownV2'); return
+        context.user_data['more_albums'] = [view_album(album) for album in albums['items']]
+        await send_album_page(update, context)
+    except Exception as e: logger.error("Error saat mengambil album artis: %s", e); await update.message.reply_text("Maaf, terjadi kesalahan.")
+async def get_more_albums(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Menampilkan album berikutnya dari hasil /getartistalbums terakhir tanpa memanggil Spotify lagi."""
+    if not context.user_data.get('more_albums'): await update.message.reply_text("Tidak ada album lagi. Gunakan /getartistalbums [nama artis] terlebih dahulu."); return
+    await send_album_page(update, context)
 async def get_artist_top_tracks(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not context.args: await update.message.reply_text("Contoh: /gettoptracks Queen"); return
-    query = " ".join(context.args); await update.message.reply_text(f"🏆 Mencari lagu terpopuler dari '{query}'...")
+    if not has_query(context): await update.message.reply_text("Contoh: /gettoptracks Queen"); return
+    query = " ".join(context.args)
     try:
-        results = sp.search(q=query, limit=1, type='artist')
-        if not results['artists']['items']: await update.message.reply_text(f"Maaf, artis *'{escape_markdown(query, version=2)}'* tidak ditemukan\\.", parse_mode='MarkdownV2'); return
-        artist_id = results['artists']['items'][0]['id']; top_tracks = sp.artist_top_tracks(artist_id, country='ID')
-        if not top_tracks['tracks']: await update.message.reply_text(f"Tidak dapat menemukan lagu terpopuler untuk *'{escape_markdown(query, version=2)}'*\\.", parse_mode='MarkdownV2'); return
-        for track in top_tracks['tracks']: await send_track_info(update, context, track)
-    except Exception as e: logger.error(f"Error saat mengambil lagu terpopuler: {e}"); await update.message.reply_text("Maaf, terjadi kesalahan.")
+        # Pesan status dikirim bersamaan dengan pencarian ID artis agar keduanya tidak saling menunggu
+        _, artist_id = await asyncio.gather(update.message.reply_text(f"🏆 Mencari lagu terpopuler dari '{query}'..."), resolve_artist_id(query))
+        if artist_id is None: await update.message.reply_text(f"Maaf, artis *'{_esc(query)}'* tidak ditemukan\\.", parse_mode='MarkdownV2'); return
+        top_tracks = await cached_call(ARTIST_DATA_CACHE, ('top_tracks', artist_id), sp.artist_top_tracks, artist_id, country='ID')
+        if not top_tracks['tracks']: await update.message.reply_text(f"Tidak dapat menemukan lagu terpopuler untuk *'{_esc(query)}'*\\.", parse_mode='MarkdownV2'); return
+        await send_all(update, context, send_track_info, [view_track(track) for track in top_tracks['tracks']])
+    except Exception as e: logger.error("Error saat mengambil lagu terpopuler: %s", e); await update.message.reply_text("Maaf, terjadi kesalahan.")
 async def get_related_artists(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not context.args: await update.message.reply_text("Contoh: /getrelated Daft Punk"); return
-    query = " ".join(context.args); await update.message.reply_text(f"🤝 Mencari artis yang terkait dengan '{query}'...")
+    if not has_query(context): await update.message.reply_text("Contoh: /getrelated Daft Punk"); return
+    query = " ".join(context.args)
     try:
-        results = sp.search(q=query, limit=1, type='artist')
-        if not results['artists']['items']: await update.message.reply_text(f"Maaf, artis *'{escape_markdown(query, version=2)}'* tidak ditemukan\\.", parse_mode='MarkdownV2'); return
-        artist_id = results['artists']['items'][0]['id']; related_artists = sp.artist_related_artists(artist_id)
-        if not related_artists['artists']: await update.message.reply_text(f"Tidak dapat menemukan artis terkait untuk *'{escape_markdown(query, version=2)}'*\\.", parse_mode='MarkdownV2'); return
-        await update.message.reply_text(f"Berikut 5 artis yang mirip dengan *{escape_markdown(query, version=2)}*:", parse_mode='MarkdownV2')
-        for artist in related_artists['artists'][:5]: await send_artist_info_detailed(update, context, artist)
-    except Exception as e: logger.error(f"Error saat mengambil artis terkait: {e}"); await update.message.reply_text("Maaf, terjadi kesalahan.")
+        # Pesan status dikirim bersamaan dengan pencarian ID artis agar keduanya tidak saling menunggu
+        _, artist_id = await asyncio.gather(update.message.reply_text(f"🤝 Mencari artis yang terkait dengan '{query}'..."), resolve_artist_id(query))
+        if artist_id is None: await update.message.reply_text(f"Maaf, artis *'{_esc(query)}'* tidak ditemukan\\.", parse_mode='MarkdownV2'); return
+        related_artists = await cached_call(ARTIST_DATA_CACHE, ('related', artist_id), sp.artist_related_artists, artist_id)
+        if not related_artists['artists']: await update.message.reply_text(f"Tidak dapat menemukan artis terkait untuk *'{_esc(query)}'*\\.", parse_mode='MarkdownV2'); return
+        await update.message.reply_text(f"Berikut 5 artis yang mirip dengan *{_esc(query)}*:", parse_mode='MarkdownV2')
+        await send_all(update, context, send_artist_info_detailed, [view_artist(artist) for artist in related_artists['artists'][:5]])
+    except Exception as e: logger.error("Error saat mengambil artis terkait: %s", e); await update.message.reply_text("Maaf, terjadi kesalahan.")
 
 async def unknown(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Menangani perintah yang tidak dikenali oleh bot."""
     await context.bot.send_message(chat_id=update.effective_chat.id, text="Maaf, saya tidak mengerti perintah itu. Coba /help.")
 
+# --- Tabel Perintah ---
+# Nama perintah -> (fungsi handler, deskripsi untuk menu perintah Telegram)
+COMMANDS = {
+    "start": (start, "Memulai bot"),
+    "help": (help_command, "Cara menggunakan bot"),
+
+    # Fitur pencarian
+    "cari": (search_menu, "Menu pencarian"),
+    "caritrack": (search_tracks, "Mencari lagu"),
+    "cariartist": (search_artists, "Mencari artis"),
+    "carialbum": (search_albums, "Mencari album"),
+
+    # Fitur album discovery
+    "album": (album_menu, "Menu fitur album"),
+    "randomalbum": (get_random_albums, "5 album acak"),
+    "getnewreleases": (get_new_releases, "5 rilis album terbaru"),
+
+    # Fitur artis discovery
+    "artist": (artist_menu, "Menu fitur artis"),
+    "randomartist": (get_random_artists, "5 artis acak"),
+    "getartistalbums": (get_artist_albums, "Album dari artis"),
+    "more": (get_more_albums, "Album berikutnya dari /getartistalbums"),
+    "gettoptracks": (get_artist_top_tracks, "Lagu terpopuler dari artis"),
+    "getrelated": (get_related_artists, "Artis serupa"),
+}
+
+# Pengguna yang mengirim perintah dalam USER_COMMAND_INTERVAL detik terakhir
+USER_COMMAND_INTERVAL = 1
+_recent_users = TTLCache(maxsize=10_000, ttl=USER_COMMAND_INTERVAL)
+
+def wrap_handler(handler):
+    """Membungkus handler dengan perlakuan yang sama untuk setiap perintah:
+    batas satu perintah per detik per pengguna dan balasan umum jika terjadi error."""
+    @wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        # Setiap pengguna dibatasi satu perintah per detik agar tidak menghabiskan kuota untuk pengguna lain
+        user_id = update.effective_user.id if update.effective_user else update.effective_chat.id
+        if user_id in _recent_users:
+            await update.effective_message.reply_text("Anda mengirim perintah terlalu cepat. Tunggu sebentar lalu coba lagi.")
+            return
+        _recent_users[user_id] = True
+        try:
+            await handler(update, context)
+        except Exception:
+            logger.exception("Error tak terduga di %s", handler.__name__)
+            await update.effective_message.reply_text("Maaf, terjadi kesalahan.")
+    return wrapper
+
+# Tabel dispatch yang dipakai saat runtime, dibangun sekali dari COMMANDS
+_HANDLERS = {name: wrap_handler(handler) for name, (handler, _) in COMMANDS.items()}
+_UNKNOWN_HANDLER = wrap_handler(unknown)
+
+async def dispatch(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Meneruskan perintah ke handler yang sesuai lewat satu pencarian di tabel perintah."""
+    command, *args = update.effective_message.text.split()
+    name, _, bot_username = command[1:].partition('@')
+    # Di grup, abaikan perintah yang ditujukan ke bot lain (mis. /start@BotLain)
+    if bot_username and bot_username.lower() != context.bot.username.lower():
+        return
+    handler = _HANDLERS.get(name.lower(), _UNKNOWN_HANDLER)
+    # MessageHandler tidak mengisi context.args seperti CommandHandler, jadi diisi di sini
+    context.args = args
+    await handler(update, context)
+
+# Menandai apakah cache di disk sudah dimuat. post_shutdown() tetap dijalankan PTB
+# walaupun post_init() gagal atau dihentikan, dan tanpa penanda ini cache kosong di
+# memori akan menimpa file cache yang ada.
+_caches_loaded = False
+
+async def post_init(application: Application) -> None:
+    """Memuat cache dari disk dan menyiapkan klien Spotify setelah event loop aplikasi berjalan."""
+    global _caches_loaded
+    await asyncio.to_thread(load_photo_file_id_cache)
+    await asyncio.to_thread(load_artist_id_cache)
+    _caches_loaded = True
+
+    try:
+        await sp.start()
+        logger.info("Otentikasi dengan Spotify berhasil!")
+    except Exception as e:
+        logger.error("Gagal otentikasi dengan Spotify: %s", e)
+        raise
+
+    await application.bot.set_my_commands(
+        [BotCommand(name, description) for name, (_, description) in COMMANDS.items()]
+    )
+
+    # Kegagalan di sini tidak menghentikan bot; hanya fitur acak yang tidak tersedia
+    try:
+        await build_discovery_pools(application)
+    except Exception as e:
+        logger.error("Gagal menyiapkan kumpulan album/artis acak: %s", e)
+
+async def post_shutdown(application: Application) -> None:
+    """Menutup koneksi ke Spotify dan menyimpan cache file_id serta ID artis saat bot berhenti."""
+    await sp.close()
+    if _caches_loaded:
+        await asyncio.to_thread(save_photo_file_id_cache)
+        await asyncio.to_thread(save_artist_id_cache)
+
 def main() -> None:
     """Fungsi utama untuk menginisialisasi dan menjalankan bot."""
+    global sp
+
+    # --- Memuat Environment Variables dari file .env ---
+    # Langkah ini penting agar kunci API Anda aman dan tidak tertulis langsung di kode.
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    # Mengambil kredensial Spotify dan mengecek apakah sudah diatur
+    SPOTIPY_CLIENT_ID = os.getenv("SPOTIPY_CLIENT_ID")
+    SPOTIPY_CLIENT_SECRET = os.getenv("SPOTIPY_CLIENT_SECRET")
+    if not all([SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET]):
+        raise ValueError("Pastikan SPOTIPY_CLIENT_ID dan SPOTIPY_CLIENT_SECRET sudah diatur di file .env Anda.")
+    sp = SpotifyClient(SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET)
+
     TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
     if not TELEGRAM_TOKEN:
         raise ValueError("Pastikan TELEGRAM_TOKEN sudah diatur di file .env Anda.")
 
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
-    
-    # --- Mendaftarkan semua Handler ke aplikasi ---
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("help", help_command))
-    
-    # Handler untuk fitur pencarian baru
-    application.add_handler(CommandHandler("cari", search_menu))
-    application.add_handler(CommandHandler("caritrack", search_tracks))
-    application.add_handler(CommandHandler("cariartist", search_artists))
-    application.add_handler(CommandHandler("carialbum", search_albums))
-
-    # Handler untuk fitur album discovery
-    application.add_handler(CommandHandler("album", album_menu))
-    application.add_handler(CommandHandler("randomalbum", get_random_albums))
-    application.add_handler(CommandHandler("getnewreleases", get_new_releases))
-
-    # Handler untuk fitur artis discovery
-    application.add_handler(CommandHandler("artist", artist_menu))
-    application.add_handler(CommandHandler("randomartist", get_random_artists))
-    application.add_handler(CommandHandler("getartistalbums", get_artist_albums))
-    application.add_handler(CommandHandler("gettoptracks", get_artist_top_tracks))
-    application.add_handler(CommandHandler("getrelated", get_related_artists))
+    # Menggunakan uvloop sebagai event loop jika terpasang (pip install uvloop).
+    # uvloop tidak mendukung Windows; di sana bot tetap memakai event loop bawaan asyncio.
+    if sys.platform != "win32":
+        try:
+            import uvloop
+            uvloop.install()
+        except ImportError:
+            pass
+
+    application = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        # Pool koneksi yang lebih besar agar banyak balasan bisa dikirim bersamaan
+        .request(HTTPXRequest(connection_pool_size=256, http_version="2" if HTTP2_AVAILABLE else "1.1"))
+        # Membatasi laju semua pesan keluar (30 pesan/detik secara global, 20 pesan/menit
+        # per grup) dan mengulang otomatis jika Telegram tetap membalas 429 RetryAfter.
+        # Membutuhkan: pip install "python-telegram-bot[rate-limiter]"
+        .rate_limiter(AIORateLimiter(overall_max_rate=30, overall_time_period=1, max_retries=3))
+        # Memproses beberapa update sekaligus agar permintaan Spotify yang lambat
+        # dari satu pengguna tidak menahan balasan untuk pengguna lain
+        .concurrent_updates(True)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
-    # Handler untuk perintah yang tidak dikenali (harus diletakkan paling akhir)
-    application.add_handler(MessageHandler(filters.COMMAND, unknown))
+    # --- Mendaftarkan Handler ke aplikasi ---
+    # Semua perintah melewati satu handler; pemilihan fungsinya dilakukan oleh dispatch()
+    application.add_handler(MessageHandler(filters.COMMAND, dispatch))
 
     logger.info("Bot Telegram siap dijalankan...")
-    application.run_polling()
+    # Jika WEBHOOK_BASE diatur (mis. https://bot.domainanda.com), Telegram akan mengirim
+    # update langsung ke bot lewat webhook. Tanpa itu, bot kembali ke mode polling
+    # yang lebih praktis untuk dijalankan di komputer lokal.
+    webhook_base = os.getenv("WEBHOOK_BASE")
+    if webhook_base:
+        application.run_webhook(
+            listen="0.0.0.0",
+            port=int(os.getenv("PORT", 8443)),
+            url_path=TELEGRAM_TOKEN,
+            webhook_url=f"{webhook_base.rstrip('/')}/{TELEGRAM_TOKEN}",
+            secret_token=os.getenv("WEBHOOK_SECRET"),
+        )
+    else:
+        application.run_polling()
 
 if __name__ == "__main__":
     main()